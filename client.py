@@ -3,15 +3,68 @@ client.py — Cliente CLI interactivo para el sistema de biblioteca gRPC.
 
 Conecta al servidor gRPC y presenta un menú de opciones para
 consultar, prestar y devolver libros.
+
+Si la entrada estándar no es una terminal, el cliente funciona en modo
+lote: lee todas las líneas de una vez, cada una con el formato
+``<opción> <argumento>`` (p. ej. ``1 9780134685991`` o ``3 Clean Code``),
+y ejecuta las operaciones en orden sin mostrar el menú.
 """
 
+import itertools
 import sys
+from typing import Callable, Dict, List, Tuple
 
 import grpc
 
 import biblioteca_pb2 as pb2
 import biblioteca_pb2_grpc as pb2_grpc
 
+# Cantidad de canales (conexiones HTTP/2) que abre el cliente
+TAMANO_POOL = 4
+
+# Opciones de cada canal: pool de subcanales propio y keepalive para que la
+# conexión siga abierta entre comandos de una sesión larga del menú.
+OPCIONES_CANAL = [
+    ("grpc.use_local_subchannel_pool", 1),
+    ("grpc.keepalive_time_ms", 10000),
+    ("grpc.keepalive_timeout_ms", 5000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+
+class PoolCanales:
+    """Conjunto de canales gRPC independientes hacia un mismo servidor.
+
+    Cada canal usa su propio pool de subcanales, por lo que abre su
+    propia conexión HTTP/2 en lugar de compartirla con los demás. Las
+    llamadas se reparten entre ellos en round-robin para no quedar
+    limitadas por el control de flujo de una sola conexión.
+    """
+
+    def __init__(self, direccion: str, tamano: int = TAMANO_POOL) -> None:
+        """Abre ``tamano`` canales hacia ``direccion``.
+
+        Args:
+            direccion: Dirección host:puerto del servidor.
+            tamano: Cantidad de canales del pool.
+        """
+        self._canales = [
+            grpc.insecure_channel(direccion, options=OPCIONES_CANAL)
+            for _ in range(tamano)
+        ]
+        self.stubs = [pb2_grpc.BibliotecaServiceStub(canal) for canal in self._canales]
+        self._indice = itertools.count()
+
+    def siguiente_stub(self) -> pb2_grpc.BibliotecaServiceStub:
+        """Retorna el stub del siguiente canal en orden round-robin."""
+        return self.stubs[next(self._indice) % len(self.stubs)]
+
+    def cerrar(self) -> None:
+        """Cierra todos los canales del pool."""
+        for canal in self._canales:
+            canal.close()
+
 
 def mostrar_menu() -> None:
     """Imprime el menú de opciones disponibles."""
@@ -20,16 +73,18 @@ def mostrar_menu() -> None:
     print("2) Prestar por ISBN")
     print("3) Prestar por Título")
     print("4) Devolver por ISBN")
+    print("5) Prestar lote por ISBN")
     print("0) Salir")
 
 
-def consultar_por_isbn(stub: pb2_grpc.BibliotecaServiceStub) -> None:
-    """Solicita un ISBN y muestra la información del libro.
+def consultar_por_isbn(stub: pb2_grpc.BibliotecaServiceStub, isbn: str) -> None:
+    """Muestra la información del libro con el ISBN indicado.
 
     Args:
         stub: Stub del servicio gRPC.
+        isbn: ISBN a consultar.
     """
-    isbn = input("ISBN: ").strip()
+    isbn = isbn.strip()
     if not isbn:
         print("⚠️  El ISBN no puede estar vacío.")
         return
@@ -43,30 +98,39 @@ def consultar_por_isbn(stub: pb2_grpc.BibliotecaServiceStub) -> None:
         print(f"  Disponibles: {respuesta.disponibles}")
 
 
-def prestar_por_isbn(stub: pb2_grpc.BibliotecaServiceStub) -> None:
-    """Solicita un ISBN y registra un préstamo.
+def prestar_por_isbn(stub: pb2_grpc.BibliotecaServiceStub, isbn: str) -> None:
+    """Registra un préstamo por ISBN y muestra los datos del libro.
+
+    Usa ConsultarYPrestarPorIsbn para obtener la consulta y el préstamo
+    en un solo viaje al servidor.
 
     Args:
         stub: Stub del servicio gRPC.
+        isbn: ISBN del libro a prestar.
     """
-    isbn = input("ISBN: ").strip()
+    isbn = isbn.strip()
     if not isbn:
         print("⚠️  El ISBN no puede estar vacío.")
         return
-    respuesta = stub.PrestarPorIsbn(pb2.PrestamoIsbnRequest(isbn=isbn))
-    print(respuesta.mensaje)
-    if respuesta.ok:
-        print(f"  Fecha devolución:     {respuesta.fecha_devolucion}")
-        print(f"  Disponibles restantes: {respuesta.disponibles_restantes}")
+    respuesta = stub.ConsultarYPrestarPorIsbn(pb2.PrestamoIsbnRequest(isbn=isbn))
+    consulta, prestamo = respuesta.consulta, respuesta.prestamo
+    if consulta.existe:
+        print(f"  Título:      {consulta.titulo}")
+        print(f"  Autor:       {consulta.autor}")
+    print(prestamo.mensaje)
+    if prestamo.ok:
+        print(f"  Fecha devolución:     {prestamo.fecha_devolucion}")
+        print(f"  Disponibles restantes: {prestamo.disponibles_restantes}")
 
 
-def prestar_por_titulo(stub: pb2_grpc.BibliotecaServiceStub) -> None:
-    """Solicita un título y registra un préstamo.
+def prestar_por_titulo(stub: pb2_grpc.BibliotecaServiceStub, titulo: str) -> None:
+    """Registra un préstamo por título exacto.
 
     Args:
         stub: Stub del servicio gRPC.
+        titulo: Título exacto del libro a prestar.
     """
-    titulo = input("Título exacto: ").strip()
+    titulo = titulo.strip()
     if not titulo:
         print("⚠️  El título no puede estar vacío.")
         return
@@ -77,13 +141,14 @@ def prestar_por_titulo(stub: pb2_grpc.BibliotecaServiceStub) -> None:
         print(f"  Disponibles restantes: {respuesta.disponibles_restantes}")
 
 
-def devolver_por_isbn(stub: pb2_grpc.BibliotecaServiceStub) -> None:
-    """Solicita un ISBN y registra la devolución del libro.
+def devolver_por_isbn(stub: pb2_grpc.BibliotecaServiceStub, isbn: str) -> None:
+    """Registra la devolución del libro con el ISBN indicado.
 
     Args:
         stub: Stub del servicio gRPC.
+        isbn: ISBN del libro a devolver.
     """
-    isbn = input("ISBN: ").strip()
+    isbn = isbn.strip()
     if not isbn:
         print("⚠️  El ISBN no puede estar vacío.")
         return
@@ -93,29 +158,60 @@ def devolver_por_isbn(stub: pb2_grpc.BibliotecaServiceStub) -> None:
         print(f"  Disponibles ahora: {respuesta.disponibles}")
 
 
-def main() -> None:
-    """Punto de entrada del cliente.
+def prestar_lote(stub: pb2_grpc.BibliotecaServiceStub, isbns_texto: str) -> None:
+    """Registra el préstamo de varios ISBN en una sola llamada.
 
-    Establece la conexión gRPC y ejecuta el bucle del menú interactivo.
-    Maneja errores de conexión y desconexiones del servidor.
+    Args:
+        stub: Stub del servicio gRPC.
+        isbns_texto: ISBNs separados por coma.
     """
-    direccion = "localhost:50051"
-    print(f"Conectando al servidor gRPC en {direccion}...")
+    isbns = [isbn.strip() for isbn in isbns_texto.split(",") if isbn.strip()]
+    if not isbns:
+        print("⚠️  Debe indicar al menos un ISBN.")
+        return
+    respuesta = stub.PrestarLote(
+        pb2.PrestamoLoteRequest(items=[pb2.PrestamoIsbnRequest(isbn=isbn) for isbn in isbns])
+    )
+    for isbn, resultado in zip(isbns, respuesta.resultados):
+        print(f"{isbn}: {resultado.mensaje}")
+        if resultado.ok:
+            print(f"  Fecha devolución:     {resultado.fecha_devolucion}")
+            print(f"  Disponibles restantes: {resultado.disponibles_restantes}")
+
+
+Accion = Callable[[pb2_grpc.BibliotecaServiceStub, str], None]
+
+# Opción del menú → (texto a solicitar en modo interactivo, acción)
+OPCIONES: Dict[str, Tuple[str, Accion]] = {
+    "1": ("ISBN: ", consultar_por_isbn),
+    "2": ("ISBN: ", prestar_por_isbn),
+    "3": ("Título exacto: ", prestar_por_titulo),
+    "4": ("ISBN: ", devolver_por_isbn),
+    "5": ("ISBNs separados por coma: ", prestar_lote),
+}
 
+
+def ejecutar_accion(accion: Accion, stub: pb2_grpc.BibliotecaServiceStub, argumento: str) -> None:
+    """Ejecuta una acción mostrando los errores de comunicación gRPC.
+
+    Args:
+        accion: Función de la tabla OPCIONES.
+        stub: Stub del servicio gRPC.
+        argumento: Argumento de la acción (ISBN, título o lista de ISBN).
+    """
     try:
-        channel = grpc.insecure_channel(direccion)
-        stub = pb2_grpc.BibliotecaServiceStub(channel)
-    except Exception as error:
-        print(f"❌ Error al conectar con el servidor: {error}")
-        sys.exit(1)
+        accion(stub, argumento)
+    except grpc.RpcError as error:
+        print(f"❌ Error de comunicación con el servidor: {error.details()}")
+        print(f"   Código: {error.code().name}")
 
-    opciones = {
-        "1": consultar_por_isbn,
-        "2": prestar_por_isbn,
-        "3": prestar_por_titulo,
-        "4": devolver_por_isbn,
-    }
 
+def ejecutar_interactivo(pool: PoolCanales) -> None:
+    """Ejecuta el bucle del menú interactivo hasta que el usuario elige salir.
+
+    Args:
+        pool: Pool de canales del que se toma un stub por operación.
+    """
     while True:
         mostrar_menu()
         opcion = input("Opción: ").strip()
@@ -124,16 +220,78 @@ def main() -> None:
             print("👋 ¡Hasta luego!")
             break
 
-        accion = opciones.get(opcion)
-        if accion:
-            try:
-                accion(stub)
-            except grpc.RpcError as error:
-                print(f"❌ Error de comunicación con el servidor: {error.details()}")
-                print(f"   Código: {error.code().name}")
+        entrada = OPCIONES.get(opcion)
+        if entrada:
+            solicitud, accion = entrada
+            ejecutar_accion(accion, pool.siguiente_stub(), input(solicitud))
         else:
             print("⚠️  Opción inválida. Intente de nuevo.")
 
 
+def parsear_lote(lineas: List[str]) -> List[Tuple[Accion, str]]:
+    """Convierte las líneas de un lote en pares (acción, argumento).
+
+    Cada línea tiene el formato ``<opción> <argumento>``. Se ignoran las
+    líneas vacías y las que comienzan con ``#``; la opción ``0`` termina
+    el lote. Las opciones desconocidas se reportan y se omiten.
+
+    Args:
+        lineas: Líneas de texto del lote.
+
+    Returns:
+        Lista de acciones a ejecutar, en orden.
+    """
+    operaciones: List[Tuple[Accion, str]] = []
+    for numero_linea, linea in enumerate(lineas, start=1):
+        linea = linea.strip()
+        if not linea or linea.startswith("#"):
+            continue
+        opcion, _, argumento = linea.partition(" ")
+        if opcion == "0":
+            break
+        entrada = OPCIONES.get(opcion)
+        if entrada is None:
+            print(f"⚠️  Línea {numero_linea}: opción inválida '{opcion}'.")
+            continue
+        operaciones.append((entrada[1], argumento))
+    return operaciones
+
+
+def ejecutar_lote(pool: PoolCanales, lineas: List[str]) -> None:
+    """Ejecuta en orden todas las operaciones de un lote, sin menú ni prompts.
+
+    Args:
+        pool: Pool de canales del que se toma un stub por operación.
+        lineas: Líneas de texto del lote (ver parsear_lote()).
+    """
+    for accion, argumento in parsear_lote(lineas):
+        ejecutar_accion(accion, pool.siguiente_stub(), argumento)
+
+
+def main() -> None:
+    """Punto de entrada del cliente.
+
+    Establece la conexión gRPC y ejecuta el menú interactivo o, si la
+    entrada estándar no es una terminal, el modo lote.
+    Maneja errores de conexión y desconexiones del servidor.
+    """
+    direccion = "localhost:50051"
+    print(f"Conectando al servidor gRPC en {direccion}...")
+
+    try:
+        pool = PoolCanales(direccion)
+    except Exception as error:
+        print(f"❌ Error al conectar con el servidor: {error}")
+        sys.exit(1)
+
+    try:
+        if sys.stdin.isatty():
+            ejecutar_interactivo(pool)
+        else:
+            ejecutar_lote(pool, sys.stdin.read().splitlines())
+    finally:
+        pool.cerrar()
+
+
 if __name__ == "__main__":
     main()
@@ -2,28 +2,34 @@
 models.py — Modelo de dominio del sistema de biblioteca.
 
 Define la entidad Libro como dataclass con validación de campos.
+Libro declara ``__slots__`` para que cada instancia no lleve un
+``__dict__`` propio: ocupa menos memoria y el acceso a atributos es más
+rápido, lo que importa porque el repositorio mantiene todo el catálogo
+en memoria.
 """
 
 from __future__ import annotations
 
-import re
 from dataclasses import dataclass
+from functools import lru_cache
 
 
-# Patrón ISBN-13: exactamente 13 dígitos (sin guiones)
-_ISBN_PATTERN = re.compile(r"^\d{13}$")
-
-
+@lru_cache(maxsize=4096)
 def validar_isbn(isbn: str) -> bool:
     """Verifica que un ISBN tenga formato válido (13 dígitos numéricos).
 
+    El resultado se memoriza por cadena: el servidor valida una y otra
+    vez los mismos ISBN, y la función no tiene efectos secundarios.
+
     Args:
         isbn: Cadena a validar como ISBN-13.
 
     Returns:
         True si el ISBN tiene exactamente 13 dígitos, False en caso contrario.
     """
-    return bool(_ISBN_PATTERN.match(isbn.strip()))
+    # isdecimal() acepta los mismos dígitos que \d en un patrón str.
+    isbn = isbn.strip()
+    return len(isbn) == 13 and isbn.isdecimal()
 
 
 @dataclass
@@ -38,6 +44,10 @@ class Libro:
         prestados: Cantidad de ejemplares actualmente prestados.
     """
 
+    # Declarado a mano (y no con dataclass(slots=True)) para seguir
+    # soportando Python 3.8; los campos no deben tener valores por defecto.
+    __slots__ = ("isbn", "titulo", "autor", "total", "prestados")
+
     isbn: str
     titulo: str
     autor: str
@@ -11,15 +11,56 @@ Formato de cada línea:
 from __future__ import annotations
 
 import logging
+import mmap
 import threading
+from array import array
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from models import Libro, validar_isbn
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class _CacheLibros:
+    """Instantánea de los libros en memoria junto con sus índices.
+
+    Se reemplaza completa en cada recarga para que un lector nunca
+    combine la lista de una carga con los índices de otra. Los datos por
+    registro se guardan como columnas paralelas a ``libros``: los índices
+    apuntan a una posición y ``offsets``/``longitudes`` son arreglos
+    compactos de enteros, sin una tupla por libro.
+
+    Attributes:
+        libros: Lista de libros tal como la retorna cargar().
+        firma: Fecha de modificación (ns) y tamaño del archivo que refleja esa lista.
+        by_isbn: Índice ISBN → posición en ``libros``.
+        by_titulo: Índice título normalizado → posición en ``libros``.
+        offsets: Offset en bytes de la línea de cada libro.
+        longitudes: Longitud en bytes de la línea de cada libro, sin el salto.
+    """
+
+    libros: List[Libro]
+    firma: Tuple[int, int]
+    by_isbn: Dict[str, int]
+    by_titulo: Dict[str, int]
+    offsets: array
+    longitudes: array
+
+    def posicion(self, libro: Libro) -> Optional[int]:
+        """Retorna la posición de ``libro`` (por identidad) o None si no está."""
+        posicion = self.by_isbn.get(libro.isbn)
+        if posicion is not None and self.libros[posicion] is libro:
+            return posicion
+        # ISBN repetido en el archivo: solo el primero está en el índice
+        for posicion, candidato in enumerate(self.libros):
+            if candidato is libro:
+                return posicion
+        return None
+
+
 class RepositorioTxtBiblioteca:
     """Repositorio que persiste libros en un archivo de texto plano.
 
@@ -27,6 +68,15 @@ class RepositorioTxtBiblioteca:
     por el carácter pipe (|). Proporciona operaciones de lectura,
     escritura y búsqueda con soporte de concurrencia mediante Lock.
 
+    Los libros leídos se mantienen en una caché en memoria que solo se
+    invalida cuando cambia la fecha de modificación o el tamaño del
+    archivo, de modo que las lecturas repetidas no vuelven a parsear el archivo completo.
+    Junto a la caché se mantienen índices por ISBN y por título para que
+    las búsquedas sobre la lista en caché sean accesos directos a diccionario,
+    y la ubicación en bytes de cada registro para poder reescribir solo las
+    líneas de los libros modificados sin regenerar el archivo completo (ver
+    marcar_modificado() y guardar_pendientes()).
+
     Attributes:
         path: Ruta al archivo de datos.
     """
@@ -39,6 +89,14 @@ class RepositorioTxtBiblioteca:
         """
         self.path = Path(ruta_archivo)
         self._lock = threading.Lock()
+        self._cache_lock = threading.RLock()
+        self._cache: Optional[_CacheLibros] = None
+        # Libros modificados en memoria pendientes de escribir, por identidad
+        self._pendientes: Dict[int, Libro] = {}
+        # True mientras guardar_pendientes() escribe los libros que retiró
+        self._escribiendo = False
+        # Buffer reutilizado entre reescrituras completas del archivo
+        self._buffer = bytearray(1 << 16)
         logger.info("Repositorio inicializado con archivo: %s", self.path.resolve())
 
     def _ensure_file(self) -> None:
@@ -48,63 +106,321 @@ class RepositorioTxtBiblioteca:
             self.path.write_text("", encoding="utf-8")
             logger.info("Archivo de datos creado: %s", self.path)
 
+    def _firma_actual(self) -> Tuple[int, int]:
+        """Retorna la fecha de modificación (ns) y el tamaño del archivo.
+
+        Comparar también el tamaño detecta cambios externos que caen en
+        la misma marca de tiempo en sistemas de archivos con poca
+        resolución. Crea el archivo si todavía no existe.
+        """
+        try:
+            estado = self.path.stat()
+        except FileNotFoundError:
+            self._ensure_file()
+            estado = self.path.stat()
+        return estado.st_mtime_ns, estado.st_size
+
     def cargar(self) -> List[Libro]:
-        """Lee todos los libros del archivo de datos.
+        """Retorna todos los libros del archivo de datos.
+
+        Si el archivo no ha cambiado (misma fecha de modificación y mismo
+        tamaño) desde la última lectura o escritura, retorna la lista en
+        caché sin volver a leerlo. Los libros retornados son compartidos:
+        las modificaciones deben persistirse con guardar().
+
+        Mientras haya libros marcados sin persistir o guardar_pendientes()
+        esté escribiendo, la caché prevalece sobre el archivo: releerlo
+        descartaría esas modificaciones, y esperar a que termine la
+        escritura bloquearía al llamador durante el acceso a disco.
 
-        Ignora líneas vacías y líneas con formato incorrecto (≠ 5 campos).
-        Registra advertencias para líneas malformadas.
+        Es seguro llamarlo desde varios lectores a la vez: solo uno de
+        ellos relee el archivo cuando la caché quedó obsoleta.
 
         Returns:
             Lista de objetos Libro con los datos cargados del archivo.
         """
-        self._ensure_file()
+        firma = self._firma_actual()
+        cache = self._cache
+        if cache is not None and (firma == cache.firma or self._pendientes or self._escribiendo):
+            return cache.libros
+        with self._cache_lock:
+            cache = self._cache
+            if cache is not None and (firma == cache.firma or self._pendientes):
+                return cache.libros
+            libros, offsets, longitudes = self._leer_archivo()
+            self._actualizar_cache(libros, offsets, longitudes, firma)
+        return libros
+
+    def _actualizar_cache(
+        self, libros: List[Libro], offsets: array, longitudes: array, firma: Tuple[int, int]
+    ) -> None:
+        """Reemplaza la caché y reconstruye los índices de búsqueda.
+
+        Ante claves repetidas se conserva el primer libro, igual que
+        en la búsqueda lineal.
+
+        Args:
+            libros: Lista de libros a cachear.
+            offsets: Offset en bytes de la línea de cada libro.
+            longitudes: Longitud en bytes de la línea de cada libro.
+            firma: Fecha de modificación y tamaño del archivo que refleja esa lista.
+        """
+        by_isbn: Dict[str, int] = {}
+        by_titulo: Dict[str, int] = {}
+        for posicion, libro in enumerate(libros):
+            by_isbn.setdefault(libro.isbn, posicion)
+            by_titulo.setdefault(libro.titulo.strip().lower(), posicion)
+        self._cache = _CacheLibros(libros, firma, by_isbn, by_titulo, offsets, longitudes)
+
+    def _leer_archivo(self) -> Tuple[List[Libro], array, array]:
+        """Lee y parsea todos los libros del archivo de datos.
+
+        Recorre el archivo línea a línea en modo binario, sin cargarlo
+        completo en memoria, y decodifica cada campo solo después de
+        validar la estructura de la línea.
+        Ignora líneas vacías, líneas con formato incorrecto (≠ 5 campos) y
+        líneas cuyo ISBN no tiene 13 dígitos, que el servidor no permitiría
+        consultar. Registra advertencias para líneas malformadas.
+
+        Returns:
+            Tupla (libros, offsets, longitudes) con los libros cargados y
+            el offset y la longitud en bytes de la línea de cada uno.
+        """
         libros: List[Libro] = []
-        for numero_linea, linea in enumerate(
-            self.path.read_text(encoding="utf-8").splitlines(), start=1
-        ):
-            linea = linea.strip()
-            if not linea:
-                continue
-            partes = linea.split("|")
-            if len(partes) != 5:
-                logger.warning("Línea %d ignorada (formato inválido): %s", numero_linea, linea)
-                continue
-            isbn, titulo, autor, total_str, prestados_str = [p.strip() for p in partes]
-            try:
-                libros.append(
-                    Libro(
-                        isbn=isbn,
-                        titulo=titulo,
-                        autor=autor,
-                        total=int(total_str),
-                        prestados=int(prestados_str),
+        offsets = array("q")
+        longitudes = array("q")
+        offset = 0
+        with self.path.open("rb", buffering=1 << 20) as archivo:
+            for numero_linea, linea_bytes in enumerate(archivo, start=1):
+                inicio = offset
+                offset += len(linea_bytes)
+                contenido = linea_bytes.rstrip(b"\n")
+                linea = contenido.strip()
+                if not linea:
+                    continue
+                partes = linea.split(b"|")
+                if len(partes) != 5:
+                    logger.warning(
+                        "Línea %d ignorada (formato inválido): %s",
+                        numero_linea, linea.decode("utf-8", errors="replace"),
                     )
-                )
-            except (ValueError, TypeError) as error:
-                logger.warning("Línea %d ignorada (datos inválidos): %s — %s", numero_linea, linea, error)
-        return libros
+                    continue
+                isbn, titulo, autor, total, prestados = partes
+                isbn = isbn.strip().decode("utf-8", errors="replace")
+                if not validar_isbn(isbn):
+                    logger.warning(
+                        "Línea %d ignorada (ISBN inválido): %s",
+                        numero_linea, linea.decode("utf-8", errors="replace"),
+                    )
+                    continue
+                try:
+                    # int() ya ignora los espacios alrededor del número
+                    libro = Libro(
+                        isbn,
+                        titulo.strip().decode("utf-8"),
+                        autor.strip().decode("utf-8"),
+                        int(total),
+                        int(prestados),
+                    )
+                except (ValueError, TypeError) as error:
+                    logger.warning(
+                        "Línea %d ignorada (datos inválidos): %s — %s",
+                        numero_linea, linea.decode("utf-8", errors="replace"), error,
+                    )
+                    continue
+                libros.append(libro)
+                offsets.append(inicio)
+                longitudes.append(len(contenido))
+        return libros, offsets, longitudes
+
+    @staticmethod
+    def _formatear_linea(libro: Libro) -> bytes:
+        """Serializa un libro a su línea del archivo, sin salto de línea."""
+        return f"{libro.isbn}|{libro.titulo}|{libro.autor}|{libro.total}|{libro.prestados}".encode("utf-8")
 
     def guardar(self, libros: List[Libro]) -> None:
         """Escribe todos los libros al archivo de datos de forma atómica.
 
         Utiliza un archivo temporal intermedio para garantizar que la
-        escritura sea atómica y no corrompa los datos existentes.
+        escritura sea atómica y no corrompa los datos existentes. Si la
+        escritura falla se descarta la caché, de modo que la siguiente
+        llamada a cargar() vuelva a reflejar el contenido real del archivo.
 
         Args:
             libros: Lista de libros a persistir.
         """
+        with self._cache_lock:
+            offsets, longitudes = self._reescribir(libros)
+            self._actualizar_cache(list(libros), offsets, longitudes, self._firma_actual())
+        logger.debug("Archivo de datos guardado con %d registros.", len(libros))
+
+    def _reescribir(self, libros: List[Libro]) -> Tuple[array, array]:
+        """Reemplaza el archivo de datos completo, sin tocar la caché.
+
+        El contenido se arma en un buffer de bytes que se conserva entre
+        llamadas (y solo crece), se escribe en un archivo temporal y este
+        reemplaza al original. Si la escritura falla se descarta la caché.
+
+        Args:
+            libros: Lista de libros a persistir.
+
+        Returns:
+            Tupla (offsets, longitudes) con la ubicación de cada línea escrita.
+        """
         self._ensure_file()
         tmp = self.path.with_suffix(self.path.suffix + ".tmp")
-        contenido = "\n".join(
-            f"{libro.isbn}|{libro.titulo}|{libro.autor}|{libro.total}|{libro.prestados}"
-            for libro in libros
-        ) + ("\n" if libros else "")
-        tmp.write_text(contenido, encoding="utf-8")
-        tmp.replace(self.path)
-        logger.debug("Archivo de datos guardado con %d registros.", len(libros))
+        offsets = array("q")
+        longitudes = array("q")
+        with self._cache_lock:
+            buffer = self._buffer
+            offset = 0
+            for libro in libros:
+                linea = self._formatear_linea(libro) + b"\n"
+                fin = offset + len(linea)
+                if fin > len(buffer):
+                    buffer.extend(bytes(max(fin, 2 * len(buffer)) - len(buffer)))
+                buffer[offset:fin] = linea
+                offsets.append(offset)
+                longitudes.append(len(linea) - 1)
+                offset = fin
+            try:
+                with tmp.open("wb") as archivo:
+                    archivo.write(memoryview(buffer)[:offset])
+                tmp.replace(self.path)
+            except OSError:
+                self._cache = None
+                raise
+        return offsets, longitudes
+
+    def marcar_modificado(self, libro: Libro) -> None:
+        """Registra que un libro de la caché cambió y debe persistirse.
+
+        No escribe nada: la escritura ocurre en la siguiente llamada a
+        guardar_pendientes(), que agrupa todos los libros marcados.
+        Marcar el mismo libro varias veces equivale a marcarlo una vez.
+        Es para cambios en campos que no son claves de búsqueda: si cambia
+        el ISBN o el título de un libro, debe persistirse con guardar()
+        para que se reconstruyan los índices.
+
+        Args:
+            libro: Libro perteneciente a la lista retornada por cargar().
+
+        Raises:
+            ValueError: Si el libro no pertenece a la caché del repositorio.
+        """
+        cache = self._cache
+        if cache is None or cache.posicion(libro) is None:
+            raise ValueError(f"El libro {libro.isbn} no pertenece a la caché del repositorio.")
+        self._pendientes[id(libro)] = libro
+
+    def hay_pendientes(self) -> bool:
+        """Indica si hay libros marcados que todavía no se escribieron."""
+        return bool(self._pendientes)
+
+    def guardar_pendientes(self) -> None:
+        """Persiste los libros marcados con marcar_modificado().
+
+        Si no hay libros pendientes no accede al disco. Si la escritura
+        falla, los libros vuelven a quedar pendientes y la caché en memoria
+        se conserva, de modo que una llamada posterior pueda reintentarla
+        sin perder las modificaciones (ver _escribir_libros()). Mientras
+        escribe, cargar() sigue retornando la caché sin esperar al lock.
+
+        Raises:
+            OSError: Si falla la escritura en disco.
+        """
+        with self._cache_lock:
+            if not self._pendientes:
+                return
+            # Se activa antes de vaciar los pendientes para que cargar() nunca
+            # vea ambos vacíos con la escritura todavía en curso
+            self._escribiendo = True
+            try:
+                libros: List[Libro] = []
+                while self._pendientes:
+                    libros.append(self._pendientes.popitem()[1])
+                cache = self._cache
+                try:
+                    self._escribir_libros(cache, libros)
+                except OSError:
+                    for libro in libros:
+                        self._pendientes.setdefault(id(libro), libro)
+                    self._cache = cache
+                    raise
+            finally:
+                self._escribiendo = False
+
+    def _escribir_libros(self, cache: Optional[_CacheLibros], libros: List[Libro]) -> None:
+        """Escribe en disco las líneas de ``libros``, que pertenecen a ``cache``.
+
+        Si todas las líneas nuevas ocupan los mismos bytes que las
+        anteriores, se sobrescriben en su lugar, en orden de offset, a
+        través de un único mapeo en memoria del archivo, y se sincroniza con
+        el disco una sola vez solo el tramo que las contiene. Si alguna
+        longitud cambió (p. ej. de 9 a 10 prestados) se reescribe el
+        archivo completo conservando los índices de búsqueda; si el archivo
+        fue modificado externamente (o quedó a medio escribir tras un fallo
+        anterior), se recurre a guardar() con toda la caché.
+
+        Args:
+            cache: Instantánea de la caché al momento de la escritura.
+            libros: Libros modificados a persistir.
+        """
+        registros = []
+        for libro in libros:
+            posicion = cache.posicion(libro) if cache is not None else None
+            if posicion is None:
+                logger.warning("Libro %s descartado: ya no está en la caché.", libro.isbn)
+                continue
+            registros.append(
+                (cache.offsets[posicion], cache.longitudes[posicion], self._formatear_linea(libro))
+            )
+        if not registros:
+            return
+        if self._firma_actual() != cache.firma:
+            self.guardar(cache.libros)
+            return
+        if any(len(linea) != longitud for _, longitud, linea in registros):
+            # Las claves no cambiaron: basta con reubicar las líneas
+            offsets, longitudes = self._reescribir(cache.libros)
+            self._cache = replace(
+                cache, firma=self._firma_actual(), offsets=offsets, longitudes=longitudes
+            )
+            return
+        registros.sort()
+        # flush() exige que el inicio del tramo esté alineado a página
+        inicio = registros[0][0] - registros[0][0] % mmap.PAGESIZE
+        fin = registros[-1][0] + registros[-1][1]
+        with self.path.open("r+b") as archivo, mmap.mmap(archivo.fileno(), 0) as mapa:
+            for offset, longitud, linea in registros:
+                mapa[offset:offset + longitud] = linea
+            mapa.flush(inicio, fin - inicio)
+        self._cache = replace(cache, firma=self._firma_actual())
+        logger.debug("%d registros actualizados en su lugar.", len(registros))
+
+    def guardar_libro(self, libro: Libro) -> None:
+        """Persiste los cambios de un único libro de la caché.
+
+        Equivale a marcar_modificado() seguido de guardar_pendientes(),
+        por lo que también escribe cualquier otro libro que estuviera
+        marcado como pendiente.
+
+        Args:
+            libro: Libro perteneciente a la lista retornada por cargar().
+
+        Raises:
+            ValueError: Si el libro no pertenece a la caché del repositorio.
+        """
+        self.marcar_modificado(libro)
+        self.guardar_pendientes()
 
     def buscar_por_isbn(self, libros: List[Libro], isbn: str) -> Optional[Libro]:
-        """Busca un libro por su ISBN (comparación case-insensitive).
+        """Busca un libro por su ISBN.
+
+        Al cargar solo se aceptan ISBN de 13 dígitos (ver _leer_archivo()),
+        así que se comparan tal cual, sin normalizar mayúsculas. Si
+        ``libros`` es la lista en caché se usa el índice por ISBN; para
+        cualquier otra lista se recorre linealmente.
 
         Args:
             libros: Lista de libros donde buscar.
@@ -113,15 +429,22 @@ class RepositorioTxtBiblioteca:
         Returns:
             El Libro encontrado o None si no existe.
         """
-        isbn_normalizado = isbn.strip().lower()
+        isbn = isbn.strip()
+        cache = self._cache
+        if cache is not None and libros is cache.libros:
+            posicion = cache.by_isbn.get(isbn)
+            return None if posicion is None else libros[posicion]
         for libro in libros:
-            if libro.isbn.lower() == isbn_normalizado:
+            if libro.isbn == isbn:
                 return libro
         return None
 
     def buscar_por_titulo(self, libros: List[Libro], titulo: str) -> Optional[Libro]:
         """Busca un libro por su título exacto (comparación case-insensitive).
 
+        Si ``libros`` es la lista en caché se usa el índice por título;
+        para cualquier otra lista se recorre linealmente.
+
         Args:
             libros: Lista de libros donde buscar.
             titulo: Título a buscar.
@@ -130,6 +453,10 @@ class RepositorioTxtBiblioteca:
             El Libro encontrado o None si no existe.
         """
         titulo_normalizado = titulo.strip().lower()
+        cache = self._cache
+        if cache is not None and libros is cache.libros:
+            posicion = cache.by_titulo.get(titulo_normalizado)
+            return None if posicion is None else libros[posicion]
         for libro in libros:
             if libro.titulo.strip().lower() == titulo_normalizado:
                 return libro
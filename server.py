@@ -1,20 +1,25 @@
 """
 server.py — Servidor gRPC del sistema de gestión de biblioteca.
 
-Inicia un servidor gRPC con ThreadPoolExecutor que expone el servicio
+Inicia un servidor gRPC asíncrono (grpc.aio) que expone el servicio
 BibliotecaService para operaciones de consulta, préstamo y devolución
 de libros.
 """
 
-from concurrent import futures
-from datetime import date, timedelta
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 import logging
+import os
+import signal
+import time
+from typing import Any, Callable, Dict, List, Optional
 
 import grpc
 
 import biblioteca_pb2 as pb2
 import biblioteca_pb2_grpc as pb2_grpc
-from models import validar_isbn
+from models import Libro, validar_isbn
 from repo_txt import RepositorioTxtBiblioteca
 
 # Configuración de logging
@@ -24,13 +29,135 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Opciones de transporte del servidor: desactiva SO_REUSEPORT para que una
+# segunda instancia falle al abrir el puerto en lugar de atender con su propia
+# caché y sobrescribir el archivo, admite más streams HTTP/2 simultáneos por
+# conexión y usa tramas del tamaño máximo que permite HTTP/2. Los keepalive
+# mantienen viva la conexión de un cliente inactivo (y aceptan sus pings)
+# para que no tenga que reconectarse en la siguiente llamada. Los mensajes
+# se limitan a TAMANO_MAXIMO_MENSAJE en ambos sentidos (el valor por
+# defecto de recepción es 4 MiB); PrestarLote acota sus ítems para que su
+# respuesta, más grande que la solicitud, también quepa.
+TAMANO_MAXIMO_MENSAJE = 1 << 20
+OPCIONES_SERVIDOR = [
+    ("grpc.so_reuseport", 0),
+    ("grpc.max_concurrent_streams", 1024),
+    ("grpc.http2.max_frame_size", 16777215),
+    ("grpc.keepalive_time_ms", 10000),
+    ("grpc.keepalive_timeout_ms", 5000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.http2.min_ping_interval_without_data_ms", 5000),
+    ("grpc.max_connection_age_ms", 2**31 - 1),
+    ("grpc.max_send_message_length", TAMANO_MAXIMO_MENSAJE),
+    ("grpc.max_receive_message_length", TAMANO_MAXIMO_MENSAJE),
+]
+
+# Máximo de ítems de un PrestarLote. Cada resultado ocupa a lo sumo unos
+# 50 bytes, así que la respuesta queda muy por debajo de TAMANO_MAXIMO_MENSAJE.
+MAX_ITEMS_LOTE = 10000
+
+# Hilos del executor que realiza las escrituras en disco. Las escrituras se
+# serializan (una única tarea escritora bajo el lock del repositorio),
+# así que nunca hay más de una en curso.
+HILOS_ESCRITURA = 1
+
+# Máximo de llamadas atendidas a la vez si no se fija la variable de entorno
+# BIBLIO_GRPC_MAX_RPCS; las que exceden el límite se rechazan con
+# RESOURCE_EXHAUSTED en lugar de acumularse.
+MAX_RPCS_POR_DEFECTO = 1024
+
+# Segundos que espera el escritor en segundo plano antes de escribir, para
+# agrupar en una sola escritura las modificaciones que llegan en ráfaga
+RETARDO_ESCRITURA = 0.005
+
+# Espera antes del primer reintento tras una escritura fallida y tope de la
+# espera, que se duplica en cada fallo consecutivo
+RETARDO_PRIMER_REINTENTO = 0.05
+RETARDO_MAXIMO_REINTENTO = 5.0
+
+# Segundos que se espera a las llamadas en curso al detener el servidor
+GRACIA_DETENCION = 5.0
+
+# Días de plazo para devolver un libro prestado
+DIAS_PRESTAMO = 7
+
+
+def _entero_de_entorno(nombre: str, por_defecto: int) -> int:
+    """Lee un entero positivo de una variable de entorno.
+
+    Args:
+        nombre: Nombre de la variable de entorno.
+        por_defecto: Valor a usar si la variable no está definida.
+
+    Returns:
+        El valor de la variable, o ``por_defecto`` si no está definida.
+
+    Raises:
+        SystemExit: Si la variable no contiene un entero positivo.
+    """
+    valor = os.environ.get(nombre)
+    if valor is None:
+        return por_defecto
+    try:
+        entero = int(valor)
+    except ValueError:
+        entero = 0
+    if entero <= 0:
+        raise SystemExit(f"{nombre} debe ser un entero positivo, se recibió: {valor!r}")
+    return entero
+
+
+# Fecha de devolución en caché: (instante en que deja de valer, fecha ISO)
+_fecha_devolucion_cache = (0.0, "")
+
+
+def _fecha_devolucion() -> str:
+    """Retorna la fecha de devolución de un préstamo hecho hoy, en ISO 8601.
+
+    La fecha se calcula una vez por día local y se reutiliza hasta la
+    medianoche siguiente, de modo que cada préstamo solo consulta el reloj.
+    """
+    global _fecha_devolucion_cache
+    vence, fecha = _fecha_devolucion_cache
+    if time.time() >= vence:
+        hoy = date.today()
+        medianoche = datetime.combine(hoy + timedelta(days=1), datetime.min.time())
+        fecha = (hoy + timedelta(days=DIAS_PRESTAMO)).isoformat()
+        _fecha_devolucion_cache = (medianoche.timestamp(), fecha)
+    return fecha
+
+
+# Resultados de error con contenido fijo para los ítems de un préstamo en
+# lote, construidos una sola vez. Se comparten entre llamadas, por lo que
+# nunca deben modificarse. Las llamadas individuales no los usan: sus
+# errores se informan solo con el código de estado (ver context.abort()).
+_PRESTAMO_ISBN_VACIO = pb2.PrestamoResponse(ok=False, mensaje="El ISBN no puede estar vacío.")
+_PRESTAMO_ISBN_INVALIDO = pb2.PrestamoResponse(ok=False, mensaje="El ISBN debe tener 13 dígitos.")
+_PRESTAMO_NO_EXISTE_ISBN = pb2.PrestamoResponse(ok=False, mensaje="No existe un libro con ese ISBN.")
+_PRESTAMO_NO_DISPONIBLE = pb2.PrestamoResponse(ok=False, mensaje="No hay ejemplares disponibles.")
+
 
 class BibliotecaService(pb2_grpc.BibliotecaServiceServicer):
     """Implementación del servicio gRPC para gestión de biblioteca.
 
     Ofrece operaciones de consulta, préstamo (por ISBN o título)
-    y devolución de libros. Todas las operaciones de escritura
-    están protegidas con lock para garantizar thread-safety.
+    y devolución de libros. Los métodos son corrutinas que se ejecutan
+    en un único event loop: la búsqueda, la verificación y la
+    modificación de un libro en memoria ocurren sin puntos de espera
+    intermedios, por lo que son atómicas respecto de otras llamadas sin
+    necesidad de locks.
+
+    Las modificaciones se persisten en segundo plano (write-behind): el
+    método responde en cuanto el cambio está hecho en memoria, y una
+    tarea escritora agrupa todos los libros modificados en una sola
+    escritura, delegada a un hilo del executor por defecto (ver
+    _programar_escritura()). Si el proceso termina abruptamente, se
+    pierden las modificaciones de los últimos milisegundos.
+
+    Las respuestas exitosas de ConsultarPorIsbn se guardan por ISBN y se
+    reutilizan hasta que el repositorio recarga el archivo; los préstamos
+    y devoluciones actualizan sus contadores en el mensaje guardado.
 
     Attributes:
         repo: Repositorio de datos de la biblioteca.
@@ -43,91 +170,197 @@ class BibliotecaService(pb2_grpc.BibliotecaServiceServicer):
             repo: Instancia de RepositorioTxtBiblioteca para persistencia.
         """
         self.repo = repo
+        self._consulta_cache: Dict[str, pb2.ConsultaResponse] = {}
+        self._consulta_base: Optional[List[Libro]] = None
+        self._escritor: Optional[asyncio.Task] = None
+
+    def _actualizar_consulta(self, libro: Libro, disponibles: int) -> None:
+        """Refleja en la respuesta de consulta en caché un cambio de préstamos.
+
+        Solo cambian los contadores, así que se actualizan esos dos campos
+        del mensaje existente en lugar de descartarlo y reconstruirlo.
+
+        Args:
+            libro: Libro cuyo contador de prestados acaba de cambiar.
+            disponibles: Ejemplares disponibles del libro tras el cambio.
+        """
+        respuesta = self._consulta_cache.get(libro.isbn)
+        if respuesta is not None:
+            respuesta.prestados = libro.prestados
+            respuesta.disponibles = disponibles
+
+    async def _persistir(self, escritura: Callable[..., None], *args: Any) -> None:
+        """Ejecuta una escritura del repositorio fuera del event loop.
+
+        La escritura corre en el executor por defecto bajo el lock del
+        repositorio, para que el loop siga atendiendo otras llamadas
+        mientras se accede al disco.
+
+        Args:
+            escritura: Método de escritura del repositorio (p. ej. guardar_pendientes).
+            *args: Argumentos para ``escritura``.
+        """
+        def escribir() -> None:
+            with self.repo.with_lock():
+                escritura(*args)
+
+        await asyncio.get_running_loop().run_in_executor(None, escribir)
+
+    def _programar_escritura(self) -> None:
+        """Asegura que los libros marcados se persistan en segundo plano.
+
+        Si ya hay una tarea escritora en curso, ella recogerá también
+        las nuevas modificaciones; si no, se crea una.
+        """
+        if self._escritor is None or self._escritor.done():
+            self._escritor = asyncio.get_running_loop().create_task(self._escribir_pendientes())
+
+    async def _escribir_pendientes(self) -> None:
+        """Persiste los libros marcados hasta que no quede ninguno pendiente.
+
+        Si una escritura falla, los libros siguen pendientes en el
+        repositorio y se reintenta con una espera que se duplica en cada
+        fallo, hasta RETARDO_MAXIMO_REINTENTO.
+        """
+        espera = RETARDO_ESCRITURA
+        while True:
+            await asyncio.sleep(espera)
+            try:
+                await self._persistir(self.repo.guardar_pendientes)
+            except Exception:
+                espera = min(max(espera * 2, RETARDO_PRIMER_REINTENTO), RETARDO_MAXIMO_REINTENTO)
+                logger.exception(
+                    "Error al persistir los libros modificados; se reintenta en %.2f s", espera
+                )
+                continue
+            espera = RETARDO_ESCRITURA
+            if not self.repo.hay_pendientes():
+                return
+
+    async def cerrar(self) -> None:
+        """Espera a que terminen las escrituras en segundo plano pendientes.
+
+        Si el disco sigue fallando, espera mientras se reintentan: los
+        préstamos ya confirmados no se descartan al detener el servidor.
+        """
+        if self._escritor is not None:
+            # Si se cancela a quien espera, la escritura sigue su curso
+            await asyncio.shield(self._escritor)
 
     # ── Consulta ────────────────────────────────────────────────
 
-    def ConsultarPorIsbn(self, request: pb2.ConsultaRequest, context) -> pb2.ConsultaResponse:
+    @staticmethod
+    def _respuesta_consulta(libro) -> pb2.ConsultaResponse:
+        """Construye la ConsultaResponse de un libro existente."""
+        return pb2.ConsultaResponse(
+            existe=True,
+            mensaje="Libro encontrado.",
+            isbn=libro.isbn,
+            titulo=libro.titulo,
+            autor=libro.autor,
+            total=libro.total,
+            prestados=libro.prestados,
+            disponibles=libro.disponibles,
+        )
+
+    async def ConsultarPorIsbn(self, request: pb2.ConsultaRequest, context) -> pb2.ConsultaResponse:
         """Consulta la información de un libro dado su ISBN.
 
-        Busca el libro en la base de datos y retorna sus datos
-        completos incluyendo disponibilidad. La lectura se realiza
-        bajo lock para evitar lecturas inconsistentes.
+        Busca el libro en la caché del repositorio y retorna sus datos
+        completos incluyendo disponibilidad.
 
         Args:
             request: Mensaje con el ISBN a consultar.
             context: Contexto gRPC de la llamada.
 
         Returns:
-            ConsultaResponse con la información del libro o mensaje de error.
+            ConsultaResponse con la información del libro. Los errores se
+            informan abortando la llamada con el código de estado correspondiente.
         """
         isbn = request.isbn.strip()
         if not isbn:
-            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
-            context.set_details("El ISBN no puede estar vacío.")
-            return pb2.ConsultaResponse(existe=False, mensaje="El ISBN no puede estar vacío.")
-
-        with self.repo.with_lock():
-            try:
-                libros = self.repo.cargar()
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "El ISBN no puede estar vacío.")
+        if not validar_isbn(isbn):
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"El ISBN debe tener 13 dígitos: {isbn}")
+
+        try:
+            libros = self.repo.cargar()
+            if libros is not self._consulta_base:
+                # El repositorio recargó el archivo: las respuestas previas ya no valen
+                self._consulta_cache.clear()
+                self._consulta_base = libros
+            respuesta = self._consulta_cache.get(isbn)
+            if respuesta is None:
                 libro = self.repo.buscar_por_isbn(libros, isbn)
                 if not libro:
-                    context.set_code(grpc.StatusCode.NOT_FOUND)
-                    context.set_details(f"No existe un libro con ISBN: {isbn}")
-                    return pb2.ConsultaResponse(existe=False, mensaje="No existe un libro con ese ISBN.")
-                logger.info("Consulta exitosa — ISBN: %s, Título: %s", libro.isbn, libro.titulo)
-                return pb2.ConsultaResponse(
-                    existe=True,
-                    mensaje="Libro encontrado.",
-                    isbn=libro.isbn,
-                    titulo=libro.titulo,
-                    autor=libro.autor,
-                    total=libro.total,
-                    prestados=libro.prestados,
-                    disponibles=libro.disponibles,
-                )
-            except Exception as error:
-                logger.exception("Error al consultar ISBN %s", isbn)
-                context.set_code(grpc.StatusCode.INTERNAL)
-                context.set_details(str(error))
-                return pb2.ConsultaResponse(existe=False, mensaje=f"Error consultando: {error}")
+                    await context.abort(grpc.StatusCode.NOT_FOUND, f"No existe un libro con ISBN: {isbn}")
+                respuesta = self._respuesta_consulta(libro)
+                self._consulta_cache[isbn] = respuesta
+            logger.info("Consulta exitosa — ISBN: %s, Título: %s", respuesta.isbn, respuesta.titulo)
+            return respuesta
+        except grpc.aio.AbortError:
+            raise
+        except Exception as error:
+            logger.exception("Error al consultar ISBN %s", isbn)
+            await context.abort(grpc.StatusCode.INTERNAL, str(error))
 
     # ── Préstamos ───────────────────────────────────────────────
 
-    def _realizar_prestamo(self, libro, libros, context) -> pb2.PrestamoResponse:
-        """Lógica común para realizar un préstamo de libro.
+    def _prestar_en_memoria(self, libro) -> pb2.PrestamoResponse:
+        """Registra un préstamo sobre el libro en memoria, sin persistirlo.
 
-        Verifica disponibilidad, incrementa el contador de préstamos,
-        persiste los cambios y calcula la fecha de devolución.
+        Verifica disponibilidad, incrementa el contador de préstamos y
+        calcula la fecha de devolución. No modifica el contexto gRPC.
+        Los disponibles se calculan una sola vez y se reutilizan para la
+        caché de consultas, el log y la respuesta.
 
         Args:
             libro: Instancia de Libro a prestar (ya validada como existente).
-            libros: Lista completa de libros (para persistir).
-            context: Contexto gRPC de la llamada.
 
         Returns:
             PrestamoResponse indicando éxito o fallo del préstamo.
         """
-        if libro.disponibles <= 0:
-            context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
-            context.set_details(f"No hay ejemplares disponibles de '{libro.titulo}'.")
-            return pb2.PrestamoResponse(ok=False, mensaje="No hay ejemplares disponibles.")
+        disponibles = libro.disponibles
+        if disponibles <= 0:
+            return _PRESTAMO_NO_DISPONIBLE
 
         libro.prestados += 1
-        self.repo.guardar(libros)
+        disponibles -= 1
+        self._actualizar_consulta(libro, disponibles)
 
-        fecha_devolucion = (date.today() + timedelta(days=7)).isoformat()
+        fecha_devolucion = _fecha_devolucion()
         logger.info(
             "Préstamo realizado — ISBN: %s, Título: %s, Disponibles: %d",
-            libro.isbn, libro.titulo, libro.disponibles,
+            libro.isbn, libro.titulo, disponibles,
         )
         return pb2.PrestamoResponse(
             ok=True,
             mensaje="Préstamo realizado.",
             fecha_devolucion=fecha_devolucion,
-            disponibles_restantes=libro.disponibles,
+            disponibles_restantes=disponibles,
         )
 
-    def PrestarPorIsbn(self, request: pb2.PrestamoIsbnRequest, context) -> pb2.PrestamoResponse:
+    async def _realizar_prestamo(self, libro, context) -> pb2.PrestamoResponse:
+        """Lógica común para realizar un préstamo y agendar su persistencia.
+
+        Args:
+            libro: Instancia de Libro a prestar (ya validada como existente).
+            context: Contexto gRPC de la llamada.
+
+        Returns:
+            PrestamoResponse del préstamo realizado. Si no hay ejemplares
+            disponibles, la llamada se aborta con FAILED_PRECONDITION.
+        """
+        respuesta = self._prestar_en_memoria(libro)
+        if not respuesta.ok:
+            await context.abort(
+                grpc.StatusCode.FAILED_PRECONDITION, f"No hay ejemplares disponibles de '{libro.titulo}'."
+            )
+        self.repo.marcar_modificado(libro)
+        self._programar_escritura()
+        return respuesta
+
+    async def PrestarPorIsbn(self, request: pb2.PrestamoIsbnRequest, context) -> pb2.PrestamoResponse:
         """Registra el préstamo de un libro dado su ISBN.
 
         Busca el libro por ISBN, verifica disponibilidad y registra
@@ -142,26 +375,61 @@ class BibliotecaService(pb2_grpc.BibliotecaServiceServicer):
         """
         isbn = request.isbn.strip()
         if not isbn:
-            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
-            context.set_details("El ISBN no puede estar vacío.")
-            return pb2.PrestamoResponse(ok=False, mensaje="El ISBN no puede estar vacío.")
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "El ISBN no puede estar vacío.")
+        if not validar_isbn(isbn):
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"El ISBN debe tener 13 dígitos: {isbn}")
+
+        try:
+            libros = self.repo.cargar()
+            libro = self.repo.buscar_por_isbn(libros, isbn)
+            if not libro:
+                await context.abort(grpc.StatusCode.NOT_FOUND, f"No existe un libro con ISBN: {isbn}")
+            return await self._realizar_prestamo(libro, context)
+        except grpc.aio.AbortError:
+            raise
+        except Exception as error:
+            logger.exception("Error al prestar por ISBN %s", isbn)
+            await context.abort(grpc.StatusCode.INTERNAL, str(error))
+
+    async def ConsultarYPrestarPorIsbn(
+        self, request: pb2.PrestamoIsbnRequest, context
+    ) -> pb2.ConsultarYPrestarResponse:
+        """Consulta un libro por ISBN y registra su préstamo en una sola llamada.
+
+        Equivale a ConsultarPorIsbn seguido de PrestarPorIsbn, pero en
+        un solo viaje de red y una sola escritura.
+        La consulta retornada refleja el estado del libro tras el préstamo.
 
-        with self.repo.with_lock():
-            try:
-                libros = self.repo.cargar()
-                libro = self.repo.buscar_por_isbn(libros, isbn)
-                if not libro:
-                    context.set_code(grpc.StatusCode.NOT_FOUND)
-                    context.set_details(f"No existe un libro con ISBN: {isbn}")
-                    return pb2.PrestamoResponse(ok=False, mensaje="No existe un libro con ese ISBN.")
-                return self._realizar_prestamo(libro, libros, context)
-            except Exception as error:
-                logger.exception("Error al prestar por ISBN %s", isbn)
-                context.set_code(grpc.StatusCode.INTERNAL)
-                context.set_details(str(error))
-                return pb2.PrestamoResponse(ok=False, mensaje=f"Error prestando: {error}")
-
-    def PrestarPorTitulo(self, request: pb2.PrestamoTituloRequest, context) -> pb2.PrestamoResponse:
+        Args:
+            request: Mensaje con el ISBN del libro a consultar y prestar.
+            context: Contexto gRPC de la llamada.
+
+        Returns:
+            ConsultarYPrestarResponse con los datos del libro y el resultado del préstamo.
+        """
+        isbn = request.isbn.strip()
+        if not isbn:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "El ISBN no puede estar vacío.")
+        if not validar_isbn(isbn):
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"El ISBN debe tener 13 dígitos: {isbn}")
+
+        try:
+            libros = self.repo.cargar()
+            libro = self.repo.buscar_por_isbn(libros, isbn)
+            if not libro:
+                await context.abort(grpc.StatusCode.NOT_FOUND, f"No existe un libro con ISBN: {isbn}")
+            prestamo = await self._realizar_prestamo(libro, context)
+            return pb2.ConsultarYPrestarResponse(
+                consulta=self._respuesta_consulta(libro),
+                prestamo=prestamo,
+            )
+        except grpc.aio.AbortError:
+            raise
+        except Exception as error:
+            logger.exception("Error al consultar y prestar ISBN %s", isbn)
+            await context.abort(grpc.StatusCode.INTERNAL, str(error))
+
+    async def PrestarPorTitulo(self, request: pb2.PrestamoTituloRequest, context) -> pb2.PrestamoResponse:
         """Registra el préstamo de un libro dado su título exacto.
 
         Busca el libro por título (case-insensitive), verifica
@@ -176,28 +444,23 @@ class BibliotecaService(pb2_grpc.BibliotecaServiceServicer):
         """
         titulo = request.titulo.strip()
         if not titulo:
-            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
-            context.set_details("El título no puede estar vacío.")
-            return pb2.PrestamoResponse(ok=False, mensaje="El título no puede estar vacío.")
-
-        with self.repo.with_lock():
-            try:
-                libros = self.repo.cargar()
-                libro = self.repo.buscar_por_titulo(libros, titulo)
-                if not libro:
-                    context.set_code(grpc.StatusCode.NOT_FOUND)
-                    context.set_details(f"No existe un libro con título: {titulo}")
-                    return pb2.PrestamoResponse(ok=False, mensaje="No existe un libro con ese título.")
-                return self._realizar_prestamo(libro, libros, context)
-            except Exception as error:
-                logger.exception("Error al prestar por título '%s'", titulo)
-                context.set_code(grpc.StatusCode.INTERNAL)
-                context.set_details(str(error))
-                return pb2.PrestamoResponse(ok=False, mensaje=f"Error prestando: {error}")
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "El título no puede estar vacío.")
+
+        try:
+            libros = self.repo.cargar()
+            libro = self.repo.buscar_por_titulo(libros, titulo)
+            if not libro:
+                await context.abort(grpc.StatusCode.NOT_FOUND, f"No existe un libro con título: {titulo}")
+            return await self._realizar_prestamo(libro, context)
+        except grpc.aio.AbortError:
+            raise
+        except Exception as error:
+            logger.exception("Error al prestar por título '%s'", titulo)
+            await context.abort(grpc.StatusCode.INTERNAL, str(error))
 
     # ── Devolución ──────────────────────────────────────────────
 
-    def DevolverPorIsbn(self, request: pb2.DevolucionRequest, context) -> pb2.DevolucionResponse:
+    async def DevolverPorIsbn(self, request: pb2.DevolucionRequest, context) -> pb2.DevolucionResponse:
         """Registra la devolución de un libro dado su ISBN.
 
         Busca el libro por ISBN, verifica que existan préstamos pendientes
@@ -212,62 +475,134 @@ class BibliotecaService(pb2_grpc.BibliotecaServiceServicer):
         """
         isbn = request.isbn.strip()
         if not isbn:
-            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
-            context.set_details("El ISBN no puede estar vacío.")
-            return pb2.DevolucionResponse(ok=False, mensaje="El ISBN no puede estar vacío.", disponibles=0)
-
-        with self.repo.with_lock():
-            try:
-                libros = self.repo.cargar()
-                libro = self.repo.buscar_por_isbn(libros, isbn)
-                if not libro:
-                    context.set_code(grpc.StatusCode.NOT_FOUND)
-                    context.set_details(f"No existe un libro con ISBN: {isbn}")
-                    return pb2.DevolucionResponse(ok=False, mensaje="No existe un libro con ese ISBN.", disponibles=0)
-
-                if libro.prestados <= 0:
-                    context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
-                    context.set_details("No hay préstamos registrados para devolver.")
-                    return pb2.DevolucionResponse(
-                        ok=False,
-                        mensaje="No hay préstamos registrados para devolver.",
-                        disponibles=libro.disponibles,
-                    )
-
-                libro.prestados -= 1
-                self.repo.guardar(libros)
-
-                logger.info(
-                    "Devolución registrada — ISBN: %s, Título: %s, Disponibles: %d",
-                    libro.isbn, libro.titulo, libro.disponibles,
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "El ISBN no puede estar vacío.")
+        if not validar_isbn(isbn):
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"El ISBN debe tener 13 dígitos: {isbn}")
+
+        try:
+            libros = self.repo.cargar()
+            libro = self.repo.buscar_por_isbn(libros, isbn)
+            if not libro:
+                await context.abort(grpc.StatusCode.NOT_FOUND, f"No existe un libro con ISBN: {isbn}")
+
+            if libro.prestados <= 0:
+                await context.abort(
+                    grpc.StatusCode.FAILED_PRECONDITION, "No hay préstamos registrados para devolver."
                 )
-                return pb2.DevolucionResponse(
-                    ok=True,
-                    mensaje="Devolución registrada.",
-                    disponibles=libro.disponibles,
-                )
-            except Exception as error:
-                logger.exception("Error al devolver ISBN %s", isbn)
-                context.set_code(grpc.StatusCode.INTERNAL)
-                context.set_details(str(error))
-                return pb2.DevolucionResponse(ok=False, mensaje=f"Error devolviendo: {error}", disponibles=0)
 
+            libro.prestados -= 1
+            disponibles = libro.disponibles
+            self._actualizar_consulta(libro, disponibles)
+            self.repo.marcar_modificado(libro)
+            self._programar_escritura()
+
+            logger.info(
+                "Devolución registrada — ISBN: %s, Título: %s, Disponibles: %d",
+                libro.isbn, libro.titulo, disponibles,
+            )
+            return pb2.DevolucionResponse(
+                ok=True,
+                mensaje="Devolución registrada.",
+                disponibles=disponibles,
+            )
+        except grpc.aio.AbortError:
+            raise
+        except Exception as error:
+            logger.exception("Error al devolver ISBN %s", isbn)
+            await context.abort(grpc.StatusCode.INTERNAL, str(error))
+
+    # ── Préstamos en lote ───────────────────────────────────────
+
+    async def PrestarLote(self, request: pb2.PrestamoLoteRequest, context) -> pb2.PrestamoLoteResponse:
+        """Registra varios préstamos por ISBN en una sola llamada.
+
+        Aplica todas las solicitudes en memoria sin ceder el event loop
+        y agenda al final una sola escritura con los libros prestados. Cada
+        solicitud obtiene su propio resultado; un fallo individual (ISBN
+        vacío, inexistente o sin disponibilidad) no aborta el lote. Un lote
+        de más de MAX_ITEMS_LOTE solicitudes se rechaza completo con
+        INVALID_ARGUMENT antes de aplicar ningún préstamo, porque su
+        respuesta podría superar el tamaño máximo de mensaje.
+
+        Args:
+            request: Mensaje con la lista de solicitudes de préstamo.
+            context: Contexto gRPC de la llamada.
 
-def serve() -> None:
-    """Inicia el servidor gRPC en el puerto 50051.
+        Returns:
+            PrestamoLoteResponse con un PrestamoResponse por solicitud, en orden.
+        """
+        if len(request.items) > MAX_ITEMS_LOTE:
+            await context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                f"El lote admite hasta {MAX_ITEMS_LOTE} préstamos; se recibieron {len(request.items)}.",
+            )
+        resultados = []
+        try:
+            libros = self.repo.cargar()
+            for item in request.items:
+                isbn = item.isbn.strip()
+                if not isbn:
+                    resultados.append(_PRESTAMO_ISBN_VACIO)
+                    continue
+                if not validar_isbn(isbn):
+                    resultados.append(_PRESTAMO_ISBN_INVALIDO)
+                    continue
+                libro = self.repo.buscar_por_isbn(libros, isbn)
+                if not libro:
+                    resultados.append(_PRESTAMO_NO_EXISTE_ISBN)
+                    continue
+                resultado = self._prestar_en_memoria(libro)
+                if resultado.ok:
+                    self.repo.marcar_modificado(libro)
+                resultados.append(resultado)
+            if any(resultado.ok for resultado in resultados):
+                self._programar_escritura()
+        except Exception as error:
+            logger.exception("Error al prestar lote de %d libros", len(request.items))
+            await context.abort(grpc.StatusCode.INTERNAL, str(error))
+        return pb2.PrestamoLoteResponse(resultados=resultados)
+
+
+async def serve() -> None:
+    """Inicia el servidor gRPC asíncrono en el puerto 50051.
 
     Crea el repositorio de datos, registra el servicio y espera
-    conexiones de clientes. Soporta hasta 10 clientes concurrentes.
+    conexiones de clientes hasta recibir SIGINT (Ctrl+C) o SIGTERM.
+    Entonces deja de aceptar llamadas, da GRACIA_DETENCION segundos a
+    las que están en curso y espera a que se escriban los cambios
+    pendientes antes de terminar.
     """
+    max_rpcs = _entero_de_entorno("BIBLIO_GRPC_MAX_RPCS", MAX_RPCS_POR_DEFECTO)
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        ThreadPoolExecutor(max_workers=HILOS_ESCRITURA, thread_name_prefix="grpc-bib")
+    )
+    detener = asyncio.Event()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(senal, detener.set)
+        except NotImplementedError:
+            # Windows no admite manejadores de señales en el loop
+            pass
     repo = RepositorioTxtBiblioteca("biblioteca.txt")
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    pb2_grpc.add_BibliotecaServiceServicer_to_server(BibliotecaService(repo), server)
+    server = grpc.aio.server(options=OPCIONES_SERVIDOR, maximum_concurrent_rpcs=max_rpcs)
+    servicio = BibliotecaService(repo)
+    pb2_grpc.add_BibliotecaServiceServicer_to_server(servicio, server)
 
     server.add_insecure_port("[::]:50051")
-    server.start()
+    await server.start()
     logger.info("Servidor gRPC activo en puerto 50051")
-    server.wait_for_termination()
+    logger.info(
+        "Executor de escrituras con %d hilo; máximo %d llamadas concurrentes",
+        HILOS_ESCRITURA, max_rpcs,
+    )
+    try:
+        await detener.wait()
+        logger.info("Deteniendo el servidor...")
+    finally:
+        await server.stop(GRACIA_DETENCION)
+        await servicio.cerrar()
 
 
 if __name__ == "__main__":
-    serve()
+    asyncio.run(serve())
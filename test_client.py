@@ -0,0 +1,64 @@
+"""
+test_client.py — Tests unitarios para el modo lote de client.py.
+
+Ejecutar con:
+    python -m pytest test_client.py -v
+"""
+
+import client
+from client import (
+    consultar_por_isbn,
+    devolver_por_isbn,
+    ejecutar_lote,
+    parsear_lote,
+    prestar_por_isbn,
+    prestar_por_titulo,
+)
+
+
+# ── Tests de Modo Lote ──────────────────────────────────────────
+
+
+class TestParsearLote:
+    """Tests para la función parsear_lote."""
+
+    def test_ignora_comentarios_y_lineas_vacias(self):
+        lineas = ["# préstamos del día", "", "   ", "1 9780134685991", "  # otro comentario"]
+        assert parsear_lote(lineas) == [(consultar_por_isbn, "9780134685991")]
+
+    def test_opcion_cero_termina_el_lote(self):
+        lineas = ["2 9780134685991", "0", "4 9780134685991"]
+        assert parsear_lote(lineas) == [(prestar_por_isbn, "9780134685991")]
+
+    def test_opcion_desconocida_se_reporta_y_se_omite(self, capsys):
+        lineas = ["9 9780134685991", "4 9780134685991"]
+        assert parsear_lote(lineas) == [(devolver_por_isbn, "9780134685991")]
+        assert "Línea 1: opción inválida '9'" in capsys.readouterr().out
+
+    def test_argumento_con_espacios(self):
+        assert parsear_lote(["3 Clean Code"]) == [(prestar_por_titulo, "Clean Code")]
+
+    def test_opcion_sin_argumento(self):
+        assert parsear_lote(["1"]) == [(consultar_por_isbn, "")]
+
+
+class PoolFalso:
+    """Pool de canales que entrega siempre el mismo stub."""
+
+    def __init__(self) -> None:
+        self.stub = object()
+
+    def siguiente_stub(self):
+        return self.stub
+
+
+def test_ejecutar_lote_ejecuta_las_acciones_en_orden(monkeypatch):
+    llamadas = []
+    for opcion in ("1", "3"):
+        monkeypatch.setitem(
+            client.OPCIONES, opcion,
+            ("", lambda stub, argumento, opcion=opcion: llamadas.append((opcion, stub, argumento))),
+        )
+    pool = PoolFalso()
+    ejecutar_lote(pool, ["1 9780134685991", "3 Clean Code", "0", "1 9781492078005"])
+    assert llamadas == [("1", pool.stub, "9780134685991"), ("3", pool.stub, "Clean Code")]
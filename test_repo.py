@@ -7,10 +7,12 @@ Ejecutar con:
 
 import os
 import tempfile
+import threading
 from pathlib import Path
 
 import pytest
 
+import repo_txt
 from models import Libro, validar_isbn
 from repo_txt import RepositorioTxtBiblioteca
 
@@ -29,6 +31,12 @@ class TestLibro:
         libro = Libro(isbn="1234567890123", titulo="Test", autor="Autor", total=3, prestados=3)
         assert libro.disponibles == 0
 
+    def test_libro_no_tiene_dict_por_instancia(self):
+        libro = Libro(isbn="1234567890123", titulo="Test", autor="Autor", total=5, prestados=2)
+        assert not hasattr(libro, "__dict__")
+        with pytest.raises(AttributeError):
+            libro.otro_campo = 1
+
     def test_validacion_prestados_mayor_que_total(self):
         with pytest.raises(ValueError, match="no pueden superar el total"):
             Libro(isbn="1234567890123", titulo="Test", autor="Autor", total=2, prestados=5)
@@ -60,6 +68,12 @@ class TestValidarIsbn:
     def test_isbn_con_espacios(self):
         assert validar_isbn("  9780134685991  ") is True
 
+    def test_isbn_repetido_usa_resultado_memorizado(self):
+        validar_isbn.cache_clear()
+        assert validar_isbn("9780134685991") is True
+        assert validar_isbn("9780134685991") is True
+        assert validar_isbn.cache_info().hits == 1
+
 
 # ── Tests de Repositorio ────────────────────────────────────────
 
@@ -103,6 +117,12 @@ class TestRepositorio:
         libro = repo_temporal.buscar_por_isbn(libros, "9780134685991")
         assert libro is not None
 
+    def test_buscar_por_isbn_ignora_espacios(self, repo_temporal):
+        libros = repo_temporal.cargar()
+        libro = repo_temporal.buscar_por_isbn(libros, "  9780134685991 ")
+        assert libro is not None
+        assert repo_temporal.buscar_por_isbn(list(libros), " 9780134685991") is libro
+
     def test_buscar_por_isbn_inexistente(self, repo_temporal):
         libros = repo_temporal.cargar()
         libro = repo_temporal.buscar_por_isbn(libros, "0000000000000")
@@ -124,6 +144,31 @@ class TestRepositorio:
         libro = repo_temporal.buscar_por_titulo(libros, "Libro Inexistente")
         assert libro is None
 
+    def test_buscar_por_titulo_normalizado_al_cargar(self, repo_temporal):
+        """El título se normaliza una vez al cargar; se conserva el original para mostrar."""
+        repo_temporal.path.write_text("9780132350884|  Clean Code  |Robert C. Martin|4|4\n", encoding="utf-8")
+        libros = repo_temporal.cargar()
+        libro = repo_temporal.buscar_por_titulo(libros, "  CLEAN code ")
+        assert libro is libros[0]
+        assert libro.titulo == "Clean Code"
+
+    def test_buscar_en_lista_externa_recorre_linealmente(self, repo_temporal):
+        """Una lista que no es la caché también se puede consultar."""
+        libros = [Libro(isbn="1234567890123", titulo="Otro Libro", autor="Autor", total=1, prestados=0)]
+        assert repo_temporal.buscar_por_isbn(libros, "1234567890123") is libros[0]
+        assert repo_temporal.buscar_por_titulo(libros, "otro libro") is libros[0]
+        assert repo_temporal.buscar_por_isbn(libros, "9780134685991") is None
+
+    def test_indices_se_actualizan_tras_guardar(self, repo_temporal):
+        libros = repo_temporal.cargar()
+        libros.append(Libro(isbn="9780201633610", titulo="Design Patterns", autor="Erich Gamma", total=6, prestados=1))
+        repo_temporal.guardar(libros)
+
+        libros = repo_temporal.cargar()
+        libro = repo_temporal.buscar_por_titulo(libros, "design patterns")
+        assert libro is not None
+        assert repo_temporal.buscar_por_isbn(libros, "9780201633610") is libro
+
     def test_guardar_y_recargar(self, repo_temporal):
         libros = repo_temporal.cargar()
         libros[0].prestados += 1
@@ -132,6 +177,160 @@ class TestRepositorio:
         libros_recargados = repo_temporal.cargar()
         assert libros_recargados[0].prestados == 3
 
+    def test_guardar_lista_mas_corta_no_deja_restos(self, repo_temporal):
+        """El buffer reutilizado entre escrituras no filtra bytes de la anterior."""
+        libros = repo_temporal.cargar()
+        repo_temporal.guardar(libros)
+        repo_temporal.guardar(libros[:1])
+
+        assert repo_temporal.path.read_text(encoding="utf-8") == "9780134685991|Effective Java|Joshua Bloch|5|2\n"
+
+    def test_guardar_libro_actualiza_solo_su_linea(self, repo_temporal):
+        libros = repo_temporal.cargar()
+        libro = repo_temporal.buscar_por_isbn(libros, "9781492078005")
+        libro.prestados += 1
+        repo_temporal.guardar_libro(libro)
+
+        lineas = repo_temporal.path.read_text(encoding="utf-8").splitlines()
+        assert lineas == [
+            "9780134685991|Effective Java|Joshua Bloch|5|2",
+            "9781492078005|Designing Data-Intensive Applications|Martin Kleppmann|3|1",
+            "9780132350884|Clean Code|Robert C. Martin|4|4",
+        ]
+        assert repo_temporal.cargar() is libros
+
+    def test_guardar_libro_no_reemplaza_el_archivo(self, repo_temporal):
+        """Un cambio de un contador se escribe sobre el mismo archivo, sin copia temporal."""
+        libros = repo_temporal.cargar()
+        inodo = repo_temporal.path.stat().st_ino
+        libros[0].prestados -= 1
+        repo_temporal.guardar_libro(libros[0])
+
+        assert repo_temporal.path.stat().st_ino == inodo
+        assert repo_temporal.path.read_text(encoding="utf-8").splitlines()[0].endswith("|5|1")
+
+    def test_guardar_libro_reescribe_si_cambia_la_longitud(self, repo_temporal):
+        libros = repo_temporal.cargar()
+        libros[0].total = 10
+        libros[0].prestados = 10
+        repo_temporal.guardar_libro(libros[0])
+        libros[1].prestados = 1
+        repo_temporal.guardar_libro(libros[1])
+
+        lineas = repo_temporal.path.read_text(encoding="utf-8").splitlines()
+        assert [linea.rsplit("|", 2)[1:] for linea in lineas] == [["10", "10"], ["3", "1"], ["4", "4"]]
+
+    def test_guardar_libro_conserva_indices_si_cambia_la_longitud(self, repo_temporal):
+        libros = repo_temporal.cargar()
+        indice = repo_temporal._cache.by_isbn
+        libros[0].total = 10
+        libros[0].prestados = 10
+        repo_temporal.guardar_libro(libros[0])
+
+        assert repo_temporal.cargar() is libros
+        assert repo_temporal._cache.by_isbn is indice
+        libros[1].prestados = 1
+        repo_temporal.guardar_libro(libros[1])
+        assert repo_temporal.path.read_text(encoding="utf-8").splitlines()[1].endswith("|3|1")
+
+    def test_guardar_libro_con_isbn_repetido(self, repo_temporal):
+        """El libro se ubica por identidad aunque su ISBN esté repetido."""
+        repo_temporal.path.write_text(
+            "9780134685991|Effective Java|Joshua Bloch|5|2\n"
+            "9780134685991|Effective Java 2|Joshua Bloch|5|2\n",
+            encoding="utf-8",
+        )
+        libros = repo_temporal.cargar()
+        libros[1].prestados = 3
+        repo_temporal.guardar_libro(libros[1])
+
+        lineas = repo_temporal.path.read_text(encoding="utf-8").splitlines()
+        assert lineas[0].endswith("|5|2")
+        assert lineas[1] == "9780134685991|Effective Java 2|Joshua Bloch|5|3"
+
+    def test_guardar_libro_fuera_de_cache(self, repo_temporal):
+        libro = Libro(isbn="1234567890123", titulo="Test", autor="Autor", total=1, prestados=0)
+        with pytest.raises(ValueError, match="no pertenece a la caché"):
+            repo_temporal.guardar_libro(libro)
+
+    def test_guardar_pendientes_escribe_solo_los_marcados(self, repo_temporal):
+        libros = repo_temporal.cargar()
+        libros[0].prestados = 3
+        libros[2].prestados = 1
+        repo_temporal.marcar_modificado(libros[0])
+        repo_temporal.marcar_modificado(libros[2])
+        repo_temporal.marcar_modificado(libros[2])
+        libros[1].prestados = 1  # modificado pero no marcado
+        repo_temporal.guardar_pendientes()
+
+        lineas = repo_temporal.path.read_text(encoding="utf-8").splitlines()
+        assert [linea.rsplit("|", 1)[1] for linea in lineas] == ["3", "0", "1"]
+        assert repo_temporal.cargar() is libros
+
+    def test_guardar_pendientes_sin_cambios_no_escribe(self, repo_temporal):
+        repo_temporal.cargar()
+        mtime = repo_temporal.path.stat().st_mtime_ns
+        os.utime(repo_temporal.path, ns=(mtime - 10**9, mtime - 10**9))
+        repo_temporal.guardar_pendientes()
+        assert repo_temporal.path.stat().st_mtime_ns == mtime - 10**9
+
+    def test_guardar_pendientes_conserva_cambios_si_falla(self, repo_temporal, monkeypatch):
+        """Una escritura fallida deja los libros pendientes y la caché intacta."""
+        libros = repo_temporal.cargar()
+        libros[0].prestados = 3
+        repo_temporal.marcar_modificado(libros[0])
+
+        def fallar(*args, **kwargs):
+            raise OSError(28, "No queda espacio en el dispositivo")
+
+        with monkeypatch.context() as parche:
+            parche.setattr(repo_txt.mmap, "mmap", fallar)
+            with pytest.raises(OSError):
+                repo_temporal.guardar_pendientes()
+
+        assert repo_temporal.hay_pendientes()
+        assert repo_temporal.cargar() is libros
+        assert libros[0].prestados == 3
+        repo_temporal.guardar_pendientes()
+        assert repo_temporal.path.read_text(encoding="utf-8").splitlines()[0].endswith("|5|3")
+        assert not repo_temporal.hay_pendientes()
+
+    def test_cargar_no_espera_a_una_escritura_en_curso(self, repo_temporal, monkeypatch):
+        """cargar() retorna la caché aunque la escritura ya cambió el archivo."""
+        libros = repo_temporal.cargar()
+        libros[0].prestados = 3
+        repo_temporal.marcar_modificado(libros[0])
+        escribiendo = threading.Event()
+        continuar = threading.Event()
+        escribir_libros = repo_temporal._escribir_libros
+
+        def escritura_lenta(cache, pendientes):
+            with repo_temporal.path.open("a", encoding="utf-8") as archivo:
+                archivo.write("\n")
+            escribiendo.set()
+            assert continuar.wait(timeout=2)
+            escribir_libros(cache, pendientes)
+
+        monkeypatch.setattr(repo_temporal, "_escribir_libros", escritura_lenta)
+        hilo = threading.Thread(target=repo_temporal.guardar_pendientes)
+        hilo.start()
+        try:
+            assert escribiendo.wait(timeout=2)
+            resultado = []
+            lector = threading.Thread(target=lambda: resultado.append(repo_temporal.cargar()))
+            lector.start()
+            lector.join(timeout=1)
+            assert resultado and resultado[0] is libros
+        finally:
+            continuar.set()
+            hilo.join()
+        assert repo_temporal.path.read_text(encoding="utf-8").splitlines()[0].endswith("|5|3")
+
+    def test_marcar_modificado_fuera_de_cache(self, repo_temporal):
+        libro = Libro(isbn="1234567890123", titulo="Test", autor="Autor", total=1, prestados=0)
+        with pytest.raises(ValueError, match="no pertenece a la caché"):
+            repo_temporal.marcar_modificado(libro)
+
     def test_cargar_lineas_malformadas(self):
         """Las líneas con formato incorrecto se ignoran sin error."""
         with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False, encoding="utf-8") as f:
@@ -145,6 +344,36 @@ class TestRepositorio:
         assert len(libros) == 2
         os.unlink(ruta)
 
+    def test_cargar_ignora_isbn_que_no_tiene_13_digitos(self, repo_temporal):
+        """Un registro que el servidor no permitiría consultar no se carga."""
+        repo_temporal.path.write_text(
+            "9780134685991|Effective Java|Joshua Bloch|5|2\n"
+            "ISBN-12345|Libro Antiguo|Autor|1|0\n",
+            encoding="utf-8",
+        )
+        libros = repo_temporal.cargar()
+        assert [libro.isbn for libro in libros] == ["9780134685991"]
+        assert repo_temporal.buscar_por_titulo(libros, "Libro Antiguo") is None
+
+    def test_cargar_tolera_espacios_alrededor_de_los_campos(self, repo_temporal):
+        repo_temporal.path.write_text(" 9780132350884 | Clean Code | Robert C. Martin | 4 | 1 \n", encoding="utf-8")
+        libro = repo_temporal.cargar()[0]
+        assert (libro.isbn, libro.titulo, libro.autor, libro.total, libro.prestados) == (
+            "9780132350884", "Clean Code", "Robert C. Martin", 4, 1,
+        )
+
+    def test_cargar_linea_con_utf8_invalido(self):
+        """Una línea que no es UTF-8 válido se ignora sin descartar las demás."""
+        with tempfile.NamedTemporaryFile(mode="wb", suffix=".txt", delete=False) as f:
+            f.write("9780134685991|Effective Java|Joshua Bloch|5|2\n".encode("utf-8"))
+            f.write(b"9781492078005|Designing \xff Data|Martin|3|0\n")
+            f.write("9780132350884|Código Limpio|Robert C. Martin|4|4".encode("utf-8"))
+            ruta = f.name
+        repo = RepositorioTxtBiblioteca(ruta)
+        libros = repo.cargar()
+        assert [libro.titulo for libro in libros] == ["Effective Java", "Código Limpio"]
+        os.unlink(ruta)
+
     def test_archivo_inexistente_se_crea(self):
         """Si el archivo no existe, se crea automáticamente."""
         ruta = os.path.join(tempfile.gettempdir(), "test_biblioteca_nueva.txt")
@@ -178,6 +407,31 @@ class TestRepositorio:
         libro = repo_temporal.buscar_por_isbn(libros, "9780134685991")
         assert libro.disponibles == disponibles_antes
 
+    def test_cargar_reutiliza_cache_si_archivo_no_cambia(self, repo_temporal):
+        """Dos lecturas sin cambios en disco retornan la misma lista en caché."""
+        assert repo_temporal.cargar() is repo_temporal.cargar()
+
+    def test_cargar_recarga_si_archivo_cambia_externamente(self, repo_temporal):
+        """Una modificación externa del archivo invalida la caché."""
+        repo_temporal.cargar()
+        repo_temporal.path.write_text("9780201633610|Design Patterns|Erich Gamma|6|1\n", encoding="utf-8")
+        mtime = repo_temporal.path.stat().st_mtime_ns + 1_000_000
+        os.utime(repo_temporal.path, ns=(mtime, mtime))
+
+        libros = repo_temporal.cargar()
+        assert len(libros) == 1
+        assert libros[0].titulo == "Design Patterns"
+
+    def test_cargar_recarga_si_cambia_el_tamano_con_igual_mtime(self, repo_temporal):
+        """Un cambio externo que conserva la fecha de modificación se detecta por tamaño."""
+        repo_temporal.cargar()
+        estado = repo_temporal.path.stat()
+        repo_temporal.path.write_text("9780201633610|Design Patterns|Erich Gamma|6|1\n", encoding="utf-8")
+        os.utime(repo_temporal.path, ns=(estado.st_atime_ns, estado.st_mtime_ns))
+
+        libros = repo_temporal.cargar()
+        assert [libro.titulo for libro in libros] == ["Design Patterns"]
+
     def test_lock_se_puede_adquirir(self, repo_temporal):
         """Verifica que el lock funciona correctamente."""
         with repo_temporal.with_lock():
@@ -1,18 +1,19 @@
 """
 test_server.py — Tests de integración para el servidor gRPC de la biblioteca.
 
-Inicia un servidor gRPC en un hilo separado con un repositorio temporal
-y verifica las respuestas de cada endpoint del servicio.
+Inicia un servidor gRPC asíncrono en un event loop dentro de un hilo
+separado, con un repositorio temporal, y verifica las respuestas de cada
+endpoint del servicio usando un cliente síncrono.
 
 Ejecutar con:
     python -m pytest test_server.py -v
 """
 
+import asyncio
 import os
 import tempfile
 import threading
-import time
-from concurrent import futures
+from datetime import date, timedelta
 from pathlib import Path
 
 import grpc
@@ -21,7 +22,13 @@ import pytest
 import biblioteca_pb2 as pb2
 import biblioteca_pb2_grpc as pb2_grpc
 from repo_txt import RepositorioTxtBiblioteca
-from server import BibliotecaService
+from server import (
+    MAX_ITEMS_LOTE,
+    TAMANO_MAXIMO_MENSAJE,
+    BibliotecaService,
+    _entero_de_entorno,
+    _fecha_devolucion,
+)
 
 
 # Puerto aleatorio para evitar conflictos durante los tests
@@ -38,18 +45,27 @@ def grpc_server():
         f.write("9781492078005|Designing Data|Martin Kleppmann|3|3\n") # Agotado
         ruta_txt = f.name
 
-    repo = RepositorioTxtBiblioteca(ruta_txt)
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
-    pb2_grpc.add_BibliotecaServiceServicer_to_server(BibliotecaService(repo), server)
-    server.add_insecure_port(f"[::]:{TEST_PORT}")
-    server.start()
+    # 2. Levantar un event loop propio en un hilo para el servidor grpc.aio
+    loop = asyncio.new_event_loop()
+    hilo = threading.Thread(target=loop.run_forever, daemon=True)
+    hilo.start()
 
-    # Dar un pequeño margen para que el servidor inicie
-    time.sleep(0.5)
+    async def iniciar():
+        repo = RepositorioTxtBiblioteca(ruta_txt)
+        server = grpc.aio.server()
+        pb2_grpc.add_BibliotecaServiceServicer_to_server(BibliotecaService(repo), server)
+        server.add_insecure_port(f"[::]:{TEST_PORT}")
+        await server.start()
+        return server
+
+    server = asyncio.run_coroutine_threadsafe(iniciar(), loop).result()
 
     yield TEST_ADDRESS
 
-    server.stop(0)
+    asyncio.run_coroutine_threadsafe(server.stop(0), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    hilo.join()
+    loop.close()
     if os.path.exists(ruta_txt):
         os.unlink(ruta_txt)
 
@@ -71,10 +87,23 @@ def test_consultar_isbn_exitoso(stub):
     assert response.disponibles == 3
 
 
+def test_consultar_refleja_prestamos_posteriores(stub):
+    antes = stub.ConsultarPorIsbn(pb2.ConsultaRequest(isbn="9780134685991"))
+    stub.PrestarPorIsbn(pb2.PrestamoIsbnRequest(isbn="9780134685991"))
+    despues = stub.ConsultarPorIsbn(pb2.ConsultaRequest(isbn="9780134685991"))
+    assert despues.disponibles == antes.disponibles - 1
+    assert despues.prestados == antes.prestados + 1
+
+    stub.DevolverPorIsbn(pb2.DevolucionRequest(isbn="9780134685991"))
+    despues = stub.ConsultarPorIsbn(pb2.ConsultaRequest(isbn="9780134685991"))
+    assert despues.disponibles == antes.disponibles
+
+
 def test_consultar_isbn_inexistente(stub):
     with pytest.raises(grpc.RpcError) as e:
         stub.ConsultarPorIsbn(pb2.ConsultaRequest(isbn="0000000000000"))
     assert e.value.code() == grpc.StatusCode.NOT_FOUND
+    assert e.value.details() == "No existe un libro con ISBN: 0000000000000"
 
 
 def test_consultar_isbn_vacio(stub):
@@ -83,6 +112,18 @@ def test_consultar_isbn_vacio(stub):
     assert e.value.code() == grpc.StatusCode.INVALID_ARGUMENT
 
 
+def test_consultar_isbn_mal_formado(stub):
+    with pytest.raises(grpc.RpcError) as e:
+        stub.ConsultarPorIsbn(pb2.ConsultaRequest(isbn="978-0134685991"))
+    assert e.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+
+def test_devolver_isbn_mal_formado(stub):
+    with pytest.raises(grpc.RpcError) as e:
+        stub.DevolverPorIsbn(pb2.DevolucionRequest(isbn="12345"))
+    assert e.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+
 # ── Tests de Préstamo ───────────────────────────────────────────
 
 
@@ -90,7 +131,12 @@ def test_prestar_por_isbn_exitoso(stub):
     response = stub.PrestarPorIsbn(pb2.PrestamoIsbnRequest(isbn="9780134685991"))
     assert response.ok is True
     assert response.disponibles_restantes == 2
-    assert response.fecha_devolucion != ""
+    assert response.fecha_devolucion == (date.today() + timedelta(days=7)).isoformat()
+
+
+def test_fecha_devolucion_se_calcula_una_vez_por_dia():
+    assert _fecha_devolucion() is _fecha_devolucion()
+    assert _fecha_devolucion() == (date.today() + timedelta(days=7)).isoformat()
 
 
 def test_prestar_por_isbn_sin_disponibilidad(stub):
@@ -100,6 +146,12 @@ def test_prestar_por_isbn_sin_disponibilidad(stub):
     assert e.value.code() == grpc.StatusCode.FAILED_PRECONDITION
 
 
+def test_consultar_y_prestar_inexistente(stub):
+    with pytest.raises(grpc.RpcError) as e:
+        stub.ConsultarYPrestarPorIsbn(pb2.PrestamoIsbnRequest(isbn="0000000000000"))
+    assert e.value.code() == grpc.StatusCode.NOT_FOUND
+
+
 def test_prestar_por_titulo_exitoso(stub):
     # Nota: Usamos "Effective Java" que ahora tiene 2 disponibles tras el test anterior
     response = stub.PrestarPorTitulo(pb2.PrestamoTituloRequest(titulo="Effective Java"))
@@ -123,3 +175,157 @@ def test_devolver_sin_prestamos_previos(stub):
     response = stub.DevolverPorIsbn(pb2.DevolucionRequest(isbn="9781492078005"))
     assert response.ok is True
     assert response.disponibles == 1
+
+
+# ── Tests de Préstamo en Lote ───────────────────────────────────
+
+
+def test_prestar_lote(stub):
+    # Estado previo: 9780134685991 con 2 disponibles y 9781492078005 con 1
+    response = stub.PrestarLote(pb2.PrestamoLoteRequest(items=[
+        pb2.PrestamoIsbnRequest(isbn="9780134685991"),
+        pb2.PrestamoIsbnRequest(isbn="0000000000000"),
+        pb2.PrestamoIsbnRequest(isbn="9781492078005"),
+        pb2.PrestamoIsbnRequest(isbn="9781492078005"),
+        pb2.PrestamoIsbnRequest(isbn="97814920"),
+    ]))
+    assert [r.ok for r in response.resultados] == [True, False, True, False, False]
+    assert response.resultados[0].disponibles_restantes == 1
+    assert response.resultados[1].mensaje == "No existe un libro con ese ISBN."
+    assert response.resultados[3].mensaje == "No hay ejemplares disponibles."
+    assert response.resultados[4].mensaje == "El ISBN debe tener 13 dígitos."
+
+    consulta = stub.ConsultarPorIsbn(pb2.ConsultaRequest(isbn="9781492078005"))
+    assert consulta.disponibles == 0
+
+
+def test_prestar_lote_demasiado_grande(stub):
+    antes = stub.ConsultarPorIsbn(pb2.ConsultaRequest(isbn="9780134685991"))
+    items = [pb2.PrestamoIsbnRequest(isbn="9780134685991")] * (MAX_ITEMS_LOTE + 1)
+    with pytest.raises(grpc.RpcError) as e:
+        stub.PrestarLote(pb2.PrestamoLoteRequest(items=items))
+    assert e.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+    despues = stub.ConsultarPorIsbn(pb2.ConsultaRequest(isbn="9780134685991"))
+    assert despues.prestados == antes.prestados
+
+
+def test_respuesta_de_lote_maximo_cabe_en_un_mensaje():
+    mayor = max(
+        [
+            pb2.PrestamoResponse(
+                ok=True,
+                mensaje="Préstamo realizado.",
+                fecha_devolucion="9999-12-31",
+                disponibles_restantes=2**31 - 1,
+            ),
+            pb2.PrestamoResponse(ok=False, mensaje="El ISBN debe tener 13 dígitos."),
+            pb2.PrestamoResponse(ok=False, mensaje="No existe un libro con ese ISBN."),
+        ],
+        key=lambda resultado: resultado.ByteSize(),
+    )
+    respuesta = pb2.PrestamoLoteResponse(resultados=[mayor] * MAX_ITEMS_LOTE)
+    assert respuesta.ByteSize() <= TAMANO_MAXIMO_MENSAJE
+
+
+# ── Tests de Consulta y Préstamo ────────────────────────────────
+
+
+def test_consultar_y_prestar_exitoso(stub):
+    # Estado previo: 9780134685991 con 1 disponible tras el préstamo en lote
+    response = stub.ConsultarYPrestarPorIsbn(pb2.PrestamoIsbnRequest(isbn="9780134685991"))
+    assert response.prestamo.ok is True
+    assert response.prestamo.disponibles_restantes == 0
+    assert response.consulta.existe is True
+    assert response.consulta.titulo == "Effective Java"
+    assert response.consulta.disponibles == 0
+
+
+def test_consultar_y_prestar_sin_disponibilidad(stub):
+    with pytest.raises(grpc.RpcError) as e:
+        stub.ConsultarYPrestarPorIsbn(pb2.PrestamoIsbnRequest(isbn="9780134685991"))
+    assert e.value.code() == grpc.StatusCode.FAILED_PRECONDITION
+
+
+# ── Tests de persistencia en segundo plano ──────────────────────
+
+
+def test_prestamo_se_persiste_en_segundo_plano(tmp_path):
+    ruta = tmp_path / "biblioteca.txt"
+    ruta.write_text("9780134685991|Effective Java|Joshua Bloch|5|2\n", encoding="utf-8")
+    servicio = BibliotecaService(RepositorioTxtBiblioteca(str(ruta)))
+
+    async def prestar_y_cerrar():
+        for _ in range(2):
+            respuesta = await servicio.PrestarPorIsbn(pb2.PrestamoIsbnRequest(isbn="9780134685991"), None)
+            assert respuesta.ok is True
+        await servicio.cerrar()
+
+    asyncio.run(prestar_y_cerrar())
+    assert ruta.read_text(encoding="utf-8") == "9780134685991|Effective Java|Joshua Bloch|5|4\n"
+
+
+def test_cancelar_el_cierre_no_interrumpe_la_escritura(tmp_path):
+    ruta = tmp_path / "biblioteca.txt"
+    ruta.write_text("9780134685991|Effective Java|Joshua Bloch|5|2\n", encoding="utf-8")
+    servicio = BibliotecaService(RepositorioTxtBiblioteca(str(ruta)))
+
+    async def prestar_y_cancelar_cierre():
+        await servicio.PrestarPorIsbn(pb2.PrestamoIsbnRequest(isbn="9780134685991"), None)
+        cierre = asyncio.ensure_future(servicio.cerrar())
+        await asyncio.sleep(0)
+        cierre.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cierre
+        await servicio.cerrar()
+
+    asyncio.run(prestar_y_cancelar_cierre())
+    assert ruta.read_text(encoding="utf-8") == "9780134685991|Effective Java|Joshua Bloch|5|3\n"
+
+
+def test_prestamo_se_persiste_aunque_falle_una_escritura(tmp_path):
+    ruta = tmp_path / "biblioteca.txt"
+    ruta.write_text("9780134685991|Effective Java|Joshua Bloch|5|2\n", encoding="utf-8")
+    repo = RepositorioTxtBiblioteca(str(ruta))
+    servicio = BibliotecaService(repo)
+    guardar_pendientes = repo.guardar_pendientes
+    fallos = []
+
+    def fallar_una_vez():
+        if not fallos:
+            fallos.append(True)
+            raise OSError(28, "No queda espacio en el dispositivo")
+        guardar_pendientes()
+
+    repo.guardar_pendientes = fallar_una_vez
+
+    async def prestar_consultar_y_cerrar():
+        respuesta = await servicio.PrestarPorIsbn(pb2.PrestamoIsbnRequest(isbn="9780134685991"), None)
+        assert respuesta.disponibles_restantes == 2
+        for _ in range(400):
+            if fallos:
+                break
+            await asyncio.sleep(0.005)
+        assert fallos
+        consulta = await servicio.ConsultarPorIsbn(pb2.ConsultaRequest(isbn="9780134685991"), None)
+        assert consulta.prestados == 3
+        await servicio.cerrar()
+
+    asyncio.run(prestar_consultar_y_cerrar())
+    assert ruta.read_text(encoding="utf-8") == "9780134685991|Effective Java|Joshua Bloch|5|3\n"
+
+
+# ── Tests de configuración ──────────────────────────────────────
+
+
+def test_entero_de_entorno_usa_valor_por_defecto(monkeypatch):
+    monkeypatch.delenv("BIBLIO_GRPC_MAX_RPCS", raising=False)
+    assert _entero_de_entorno("BIBLIO_GRPC_MAX_RPCS", 1024) == 1024
+    monkeypatch.setenv("BIBLIO_GRPC_MAX_RPCS", "64")
+    assert _entero_de_entorno("BIBLIO_GRPC_MAX_RPCS", 1024) == 64
+
+
+@pytest.mark.parametrize("valor", ["muchas", "0", "-5"])
+def test_entero_de_entorno_invalido(monkeypatch, valor):
+    monkeypatch.setenv("BIBLIO_GRPC_MAX_RPCS", valor)
+    with pytest.raises(SystemExit, match="BIBLIO_GRPC_MAX_RPCS debe ser un entero positivo"):
+        _entero_de_entorno("BIBLIO_GRPC_MAX_RPCS", 1024)